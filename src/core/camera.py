@@ -1,4 +1,6 @@
 import cv2
+import time
+import threading
 from PySide6.QtCore import QThread, Signal
 import numpy as np
 from src.core.processor import ImageProcessor
@@ -8,13 +10,21 @@ class CameraThread(QThread):
     processed_data_ready = Signal(object, bool, float, list)  # 新信号：原图, 是否报警, 亮度值, 触发ROI索引列表
     error_occurred = Signal(str)
     rois_updated = Signal(list)  # 当 mask 更新时发送 ROI 轮廓列表
+    baseline_ready = Signal(int)  # 基准已在本线程重建（参数为请求编号）；先于以新基准处理的帧发出
 
     def __init__(self, camera_index=0):
         super().__init__()
         self.camera_index = camera_index
-        self._running = True
+        # 停止事件：既是循环条件，也用于可被立即唤醒的休眠（代替 msleep，停止时不必等到休眠结束）
+        self._stop_event = threading.Event()
         self.fps = 15  # 限制帧率为 15fps，足够监控使用，大幅降低 CPU 占用
         self.processor = ImageProcessor()  # 实例化图像处理器
+        # 已发送但主线程尚未取走的帧标记（latest-wins）：GUI 跟不上时丢弃新帧，而不是在事件队列中无限积压。
+        # 同时保证 processor 的双缓冲显示图像安全：主线程仍在使用的缓冲区不会被下一帧覆盖
+        self._frame_in_flight = False
+        # 基准重建请求编号：主线程每次请求加一，本线程发现编号变化时在下一帧执行 set_baseline，
+        # 基准的重建因此不会与 process() 并发；只增不清零，请求不会在两个线程之间丢失
+        self.baseline_generation = 0
 
     def run(self):
         # Try to open with CAP_DSHOW first on Windows, then fallback
@@ -39,38 +49,84 @@ class CameraThread(QThread):
 
         self.error_occurred.emit(f"Camera {self.camera_index} started successfully.")
 
-        # 帧率控制变量
-        import time
+        # 帧率控制变量：按绝对截止时间节拍，避免休眠误差逐帧累积
         frame_time = 1.0 / self.fps  # 每帧的时间间隔（秒）
-        last_time = time.time()
+        next_deadline = time.monotonic() + frame_time
 
-        while self._running:
-            ret, frame = cap.read()
+        # 读帧失败的上报节流：连续失败只在首次及之后每秒汇总上报一次，避免每 100ms 刷一条错误日志
+        read_failures = 0
+        next_failure_report = 0.0
+
+        # 循环内频繁使用的方法提前绑定为局部变量，省去每帧的属性查找
+        read = cap.read
+        process = self.processor.process
+        emit_processed = self.processed_data_ready.emit
+        wait_stop = self._stop_event.wait
+        monotonic = time.monotonic
+
+        # 采集缓冲区复用：上一帧的数组作为输出缓冲区传回 read()，尺寸一致时 OpenCV 原地写入，
+        # 不再每帧分配整帧内存（原始帧只在本线程内同步处理，发往主线程的是处理后的新图像）
+        frame = None
+        applied_baseline = 0  # 已执行的基准重建请求编号
+
+        while not self._stop_event.is_set():
+            ret, frame = read(frame)
             if ret:
-                # 在子线程中进行图像处理，减轻主线程负担
-                # Return: (vis_frame, is_triggered, total_diff_count, current_brightness, triggered_indices)
-                processed_frame, is_triggered, diff_count, current_brightness, triggered_indices = self.processor.process(frame)
-
-                # 发送处理后的数据到主线程
-                self.processed_data_ready.emit(processed_frame, is_triggered, current_brightness, triggered_indices)
-
-                # 帧率控制：计算处理时间并休眠剩余时间
-                current_time = time.time()
-                elapsed = current_time - last_time
-                if elapsed < frame_time:
-                    sleep_time = int((frame_time - elapsed) * 1000)
-                    if sleep_time > 0:
-                        self.msleep(sleep_time)
-                last_time = time.time()
+                # 读帧恢复即结束本次故障：计数与上报节流一起清零，下次故障的首次失败立即上报
+                read_failures = 0
+                next_failure_report = 0.0
+                # 先记下编号再建立基准：建立期间到达的新请求会留到下一帧处理
+                baseline_generation = self.baseline_generation
+                if baseline_generation != applied_baseline:
+                    applied_baseline = baseline_generation
+                    # 使用未经遮罩处理的原始帧建立基准，与 process() 的差分输入一致
+                    self.processor.set_baseline(frame)
+                    # 与 processed_data_ready 同为排队连接，主线程按发送顺序收到：
+                    # 在此之前入队的帧都是按旧基准处理的
+                    self.baseline_ready.emit(baseline_generation)
+                # 上一帧还在主线程队列中：结果无人消费，直接跳过本帧的处理与发送
+                if not self._frame_in_flight:
+                    # 在子线程中进行图像处理，减轻主线程负担
+                    # Return: (vis_frame, is_triggered, total_diff_count, current_brightness, triggered_indices)
+                    processed_frame, is_triggered, diff_count, current_brightness, triggered_indices = process(frame)
+
+                    # 发送处理后的数据到主线程
+                    self._frame_in_flight = True
+                    emit_processed(processed_frame, is_triggered, current_brightness, triggered_indices)
+
+                # 帧率控制：只休眠到下一帧的截止时间；处理超时则从当前时刻重新计节拍，不补帧
+                current_time = monotonic()
+                if current_time < next_deadline:
+                    wait_stop(next_deadline - current_time)
+                    next_deadline += frame_time
+                else:
+                    next_deadline = current_time + frame_time
             else:
-                self.error_occurred.emit("Failed to read frame")
+                read_failures += 1
+                current_time = monotonic()
+                if current_time >= next_failure_report:
+                    self.error_occurred.emit(f"Failed to read frame ({read_failures} consecutive failures)")
+                    next_failure_report = current_time + 1.0
                 # Add a small sleep to avoid tight loop on error
-                self.msleep(100)
+                wait_stop(0.1)
 
         cap.release()
 
+    def frame_consumed(self):
+        """主线程取走一帧后调用，允许发送下一帧"""
+        self._frame_in_flight = False
+
+    def request_baseline(self):
+        """请求以下一帧重建基准（只在主线程调用），返回本次请求的编号"""
+        self.baseline_generation += 1
+        return self.baseline_generation
+
+    def request_stop(self):
+        """只发出停止请求，不等待线程退出（便于同时停止多个摄像头）"""
+        self._stop_event.set()
+
     def stop(self):
-        self._running = False
+        self.request_stop()
         self.wait()
 
     def set_mask(self, mask_path):
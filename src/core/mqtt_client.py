@@ -1,42 +1,85 @@
 
 import paho.mqtt.client as mqtt
 from PySide6.QtCore import QObject, Signal
+import json
 import logging
+import socket
+import time
+
+# orjson 为可选依赖：安装后用于解析 state 消息（C 实现，解析大数组更快），否则回退到标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 logger = logging.getLogger("CamerApp")
 
 class MqttWorker(QObject):
     reset_signal = Signal()
     status_changed = Signal(bool, str)
+    MAX_QUEUED_MESSAGES = 100
+    # changeState 消息大小上限：正常的 144 元素 state 数组只有几百字节
+    MAX_STATE_PAYLOAD_BYTES = 64 * 1024
     
-    def __init__(self, broker="localhost", port=1883, client_id="camer", topics=["changeState", "receiver"], publish_topic="receiver"):
+    def __init__(self, broker="localhost", port=1883, client_id="camer", topics=["changeState", "receiver"], publish_topic="receiver", publish_qos=1):
         super().__init__()
         self.broker = broker
         self.port = port
         self.client_id_str = client_id
         self.topics = topics
         self.publish_topic = publish_topic
-        self.client = mqtt.Client(client_id=client_id)
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.on_publish = self.on_publish
+        self.publish_qos = publish_qos
+        self.client = self._create_client(client_id)
         self._connected = False
+        # 上一条 changeState 消息的原始内容及其判断结果
+        self._last_state_payload = None
+        self._last_state_reset = False
+        self._next_oversize_warning = 0.0  # 超大消息告警的节流截止时间（每分钟最多一条）
         
+    def _create_client(self, client_id):
+        """创建并配置 paho 客户端（初始化与更换 Client ID 时共用）"""
+        client = mqtt.Client(client_id=client_id)
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+        client.on_publish = self.on_publish
+        client.on_connect_fail = self.on_connect_fail
+        client.on_disconnect = self.on_disconnect
+        # 意外断开后由 paho 网络线程按指数退避自动重连（1s 起，最长 30s），无需额外的重连线程
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        # 限制发送队列长度：Broker 长时间不确认时丢弃新消息（publish 返回 MQTT_ERR_QUEUE_SIZE），而不是无限积压
+        client.max_queued_messages_set(self.MAX_QUEUED_MESSAGES)
+        return client
+
     def start(self):
         try:
-            self.client.connect(self.broker, self.port, 60)
+            # 异步连接：DNS 解析与 TCP 握手都在 loop_start() 的网络线程中进行，不阻塞 GUI 线程；
+            # 连接结果通过 on_connect / on_connect_fail 回调通知
+            self.client.connect_async(self.broker, self.port, 60)
             self.client.loop_start()
-            logger.info(f"MQTT Client connected to {self.broker}:{self.port}")
+            logger.info(f"正在连接 MQTT Broker {self.broker}:{self.port} ...")
         except Exception as e:
             logger.error(f"Failed to connect to MQTT broker: {e}")
 
+    def on_connect_fail(self, client, userdata):
+        logger.error(f"Failed to connect to MQTT broker {self.broker}:{self.port}, will retry.")
+        self._connected = False
+        self.status_changed.emit(False, "连接失败")
+
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             self._connected = True
             logger.info("Connected to MQTT Broker.")
+            # 关闭 Nagle 算法：触发上报是零星的小报文，避免被内核合并延迟约 40ms 再发出
+            try:
+                sock = client.socket()
+                if sock is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except (OSError, AttributeError) as e:
+                logger.warning(f"设置 TCP_NODELAY 失败: {e}")
             for topic in self.topics:
                 client.subscribe(topic)
-                logger.info(f"Subscribed to topic: {topic}")
+                logger.info("Subscribed to topic: %s", topic)
             self.status_changed.emit(True, "已连接")
         else:
             self._connected = False
@@ -45,78 +88,123 @@ class MqttWorker(QObject):
 
     def on_message(self, client, userdata, msg):
         try:
-            payload = msg.payload.decode()
-            logger.info(f"Received MQTT message on {msg.topic}: {payload}")
+            raw = msg.payload
+            # 整条消息只以 bytes 参与解析与匹配；解码只为日志服务，INFO 关闭时完全不解码
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Received MQTT message on %s: %s", msg.topic, raw.decode(errors="replace"))
             
-            # Check if it's the changeState topic
-            if msg.topic == "changeState":
-                # Parse JSON format: {"state":[1,1,1,2,0,...,1,1,1]} (144 elements)
-                import json
-                try:
-                    data = json.loads(payload)
-                    if "state" in data and isinstance(data["state"], list):
-                        # Check if the state array contains 2
-                        if 2 in data["state"]:
-                            logger.info("检测到 state 数组中包含 2，触发基线建立。")
-                            self.reset_signal.emit()
-                        else:
-                            logger.debug(f"State 数组中未检测到 2: {data['state'][:10]}...")
-                except json.JSONDecodeError as e:
-                    logger.warning(f"JSON 解析失败: {e}")
-                    # Fallback: check if payload contains '2' as string
-                    if "2" in payload:
-                        logger.info("触发基线建立（字符串匹配）。")
-                        self.reset_signal.emit()
+            # 先做最便宜、过滤率最高的主题判断，非 changeState 主题不进入 JSON 解析
+            if msg.topic != "changeState":
+                return
+
+            # 异常或恶意的超大消息直接丢弃，不在 paho 网络线程上解析和扫描
+            if len(raw) > self.MAX_STATE_PAYLOAD_BYTES:
+                now = time.monotonic()
+                if now >= self._next_oversize_warning:
+                    logger.warning("changeState 消息过大（%d 字节，上限 %d），已忽略", len(raw), self.MAX_STATE_PAYLOAD_BYTES)
+                    self._next_oversize_warning = now + 60.0
+                return
+
+            # 状态信标常以相同内容重复发布：与上一条 changeState 字节完全相同时直接复用上次的判断结果，
+            # 跳过 JSON 解析与数组扫描
+            if raw == self._last_state_payload:
+                reset = self._last_state_reset
+                if reset:
+                    logger.info("state 消息与上一条相同，触发基线建立。")
+            else:
+                reset = self._state_requests_reset(raw)
+                self._last_state_payload = raw
+                self._last_state_reset = reset
+            if reset:
+                self.reset_signal.emit()
             
         except Exception as e:
             logger.error(f"Error processing MQTT message: {e}")
 
+    def _state_requests_reset(self, raw):
+        """解析 changeState 消息，判断是否需要重建基线"""
+        # Parse JSON format: {"state":[1,1,1,2,0,...,1,1,1]} (144 elements)
+        # 直接解析原始 bytes（orjson 与 json 均支持）；orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+        try:
+            data = _json_loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning("JSON 解析失败: %s", e)
+            # Fallback: check if payload contains '2' as string
+            if b"2" in raw:
+                logger.info("触发基线建立（字符串匹配）。")
+                return True
+            return False
+
+        # 类型检查在前，线性扫描 state 数组在后
+        state = data.get("state") if isinstance(data, dict) else None
+        if not isinstance(state, list):
+            return False
+        if 2 in state:
+            logger.info("检测到 state 数组中包含 2，触发基线建立。")
+            return True
+        if logger.isEnabledFor(logging.DEBUG):
+            # 默认 INFO 级别下不切片、不格式化 state 数组
+            logger.debug("State 数组中未检测到 2: %s...", state[:10])
+        return False
+
     def on_disconnect(self, client, userdata, rc):
-        logger.warning(f"Disconnected from MQTT Broker with code: {rc}")
-        self._connected = False
-        self.status_changed.emit(False, "已断开")
+        # 只有真正建立过的连接才报告断开；后台重连失败（如 Broker 接受 TCP 后立即关闭，rc=7）
+        # 也会触发本回调，此时按连接失败处理，避免每次重试都刷一条“已断开”
+        if self._connected:
+            self._connected = False
+            logger.warning(f"Disconnected from MQTT Broker with code: {rc}")
+            self.status_changed.emit(False, "已断开")
+        elif rc != mqtt.MQTT_ERR_SUCCESS:
+            self.on_connect_fail(client, userdata)
 
     def on_publish(self, client, userdata, mid):
         """发布成功的回调"""
-        logger.info(f"消息发布成功，Message ID: {mid}")
+        logger.info("消息发布成功，Message ID: %s", mid)
 
     def reconnect(self, broker, port=1883, client_id=None, subscribe_topics=None, publish_topic=None):
         self.stop()
         self.broker = broker
         self.port = port
-        if client_id is not None:
+        # Client ID 未变化时复用现有客户端（同一连接同时负责订阅与发布），只重新连接
+        if client_id is not None and client_id != self.client_id_str:
             self.client_id_str = client_id
-            self.client = mqtt.Client(client_id=client_id)
-            self.client.on_connect = self.on_connect
-            self.client.on_message = self.on_message
-            self.client.on_publish = self.on_publish
+            self.client = self._create_client(client_id)
         if subscribe_topics is not None:
             self.topics = subscribe_topics
         if publish_topic is not None:
             self.publish_topic = publish_topic
         self.start()
 
-    def publish(self, topic, payload=""):
+    def publish(self, topic, payload="", qos=0):
+        """
+        非阻塞发布：paho 只把消息放入发送队列，由 loop_start() 的网络线程发送，调用方不等待确认。
+        QoS 0 走最快路径但不保证送达；QoS 1 由 Broker 回复 PUBACK，未确认的消息由 paho 自动重传，
+        触发上报使用 self.publish_qos（默认配置为 QoS 1）；QoS 2 需要四次握手，延迟和开销翻倍，不建议使用。
+        """
         try:
             if not self._connected:
-                logger.warning(f"MQTT 未连接，无法发布到 {topic}")
+                logger.warning("MQTT 未连接，无法发布到 %s", topic)
                 return
+            if qos >= 2:
+                logger.warning("发布到 %s 使用 QoS %d，延迟与开销较高，建议使用 QoS 0 或 1", topic, qos)
             
-            info = self.client.publish(topic, payload)
+            info = self.client.publish(topic, payload, qos=qos)
             if info.rc == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"已发布到 {topic} (Message ID: {info.mid}): {payload}")
+                logger.info("已发布到 %s (Message ID: %s): %s", topic, info.mid, payload)
             elif info.rc == mqtt.MQTT_ERR_NO_CONN:
-                logger.warning(f"发布到 {topic} 失败：没有连接")
+                logger.warning("发布到 %s 失败：没有连接", topic)
             elif info.rc == mqtt.MQTT_ERR_QUEUE_SIZE:
-                logger.warning(f"发布到 {topic} 失败：消息队列已满")
+                logger.warning("发布到 %s 失败：消息队列已满", topic)
             else:
-                logger.warning(f"发布到 {topic} 失败，返回码: {info.rc}")
+                logger.warning("发布到 %s 失败，返回码: %s", topic, info.rc)
         except Exception as e:
             logger.error(f"发布到 MQTT 失败: {e}")
 
     def stop(self):
         try:
-            self.client.loop_stop()
+            # 先断开再停止网络线程：DISCONNECT 由仍在运行的网络线程发出并唤醒其 select，
+            # loop_stop() 随即返回，而不是等待网络线程的轮询超时
             self.client.disconnect()
+            self.client.loop_stop()
         except:
             pass
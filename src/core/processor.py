@@ -1,108 +1,132 @@
 import cv2
 import numpy as np
 import logging
+from dataclasses import dataclass
 
 logger = logging.getLogger("CamerApp")
 
+@dataclass(slots=True, frozen=True, eq=False)
+class RoiRegion:
+    """单个独立 ROI 区域（slots：无实例 __dict__；frozen：解析后只读）"""
+    contour: np.ndarray
+    bounding_rect: tuple
+    sub_mask: np.ndarray
+
+@dataclass(slots=True, frozen=True, eq=False)
+class RoiState:
+    """遮罩及其 ROI 解析结果的只读快照：set_mask 在局部构建完成后整体替换，process() 每帧只读取一次，
+    主线程更换遮罩时采集线程不会读到新旧混合的 ROI 列表与索引"""
+    mask: np.ndarray | None = None
+    rois: tuple = ()  # 独立的 ROI 区域 (RoiRegion)
+    # 所有 ROI 像素的扁平索引 / 所属 ROI 编号 / 各 ROI 像素数，用于批量统计亮度
+    pixel_index: np.ndarray | None = None
+    pixel_labels: np.ndarray | None = None
+    pixel_counts: np.ndarray | None = None
+
 class ImageProcessor:
     def __init__(self):
-        self.mask = None
+        self.roi_state = RoiState()
         self.baseline = None
         self.threshold = 50   # Difference threshold per pixel
         self.min_area = 500   # Minimum number of pixels to trigger (noise filter)
         self.baseline_brightness = None
         self.roi_baseline_brightness = []  # 每个 ROI 的基线亮度
-        self.rois = []  # 独立的 ROI 区域列表 (每个包含 contour, bounding_rect, sub_mask)
+        # process() 每帧复用的工作缓冲区（首次调用时由 OpenCV 分配，之后原地写入）
+        self._small_buf = None
+        self._gray_buf = None
+        self._blur_buf = None
+        self._delta_buf = None
+        self._thresh_buf = None
+        # 输出给主线程的可视化图像使用两个缓冲区交替写入（双缓冲）：
+        # CameraThread 保证最多一帧在途，主线程处理第 N 帧时子线程只会写另一个缓冲区
+        self._vis_bufs = [None, None]
+        self._vis_index = 0
+
+    @property
+    def mask(self):
+        """当前的二值遮罩（645x360），未设置时为 None"""
+        return self.roi_state.mask
+
+    @property
+    def rois(self):
+        """当前的独立 ROI 区域"""
+        return self.roi_state.rois
 
     def set_mask(self, mask_path):
         """Loads a mask image and converts to binary, then extracts independent ROI regions."""
         if not mask_path:
-            self.mask = None
-            self.rois = []
+            self.roi_state = RoiState()
             return
 
         try:
             # Load as grayscale
             mask_img = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
             if mask_img is None:
-                logger.error(f"Failed to load mask: {mask_path}")
+                logger.error("Failed to load mask: %s", mask_path)
                 return
 
             # Threshold to binary (ensure 0 or 255)
-            _, self.mask = cv2.threshold(mask_img, 127, 255, cv2.THRESH_BINARY)
-
-            # 解析独立的连通区域
-            self.rois = []
-            contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            for contour in contours:
-                # 获取边界框
-                x, y, w, h = cv2.boundingRect(contour)
-                # 创建该 ROI 的子 mask
-                sub_mask = np.zeros_like(self.mask)
-                cv2.drawContours(sub_mask, [contour], -1, 255, -1)
-
-                # 存储 ROI 信息
-                roi = {
-                    'contour': contour,
-                    'bounding_rect': (x, y, w, h),
-                    'sub_mask': sub_mask
-                }
-                self.rois.append(roi)
-
-            logger.info(f"遮罩设置成功: {mask_path}, 解析出 {len(self.rois)} 个独立 ROI 区域")
+            _, mask = cv2.threshold(mask_img, 127, 255, cv2.THRESH_BINARY)
+            # 加载时一次性缩放到处理分辨率 645x360，每帧处理无需再检查尺寸
+            if mask.shape != (360, 645):
+                mask = cv2.resize(mask, (645, 360), interpolation=cv2.INTER_NEAREST)
+
+            # 解析独立的连通区域，完整构建后一次性替换当前状态
+            state = self._parse_roi_state(mask)
+            self.roi_state = state
+
+            logger.info("遮罩设置成功: %s, 解析出 %d 个独立 ROI 区域", mask_path, len(state.rois))
         except Exception as e:
-            logger.error(f"Error setting mask: {e}")
+            logger.error("Error setting mask: %s", e)
 
     def set_baseline(self, frame):
         """Sets the current frame as the baseline reference."""
         if frame is None:
             return
+        state = self.roi_state
 
-        # 降采样到 645x360 进行处理
+        # 降采样到 645x360 进行处理（mask 已在 set_mask 中缩放到同一尺寸）
         small_frame = cv2.resize(frame, (645, 360))
 
-        # Mask 安全检查 - 确保 mask 尺寸匹配 small_frame
-        if self.mask is not None:
-            if self.mask.shape != small_frame.shape[:2]:
-                self.mask = cv2.resize(self.mask, (645, 360), interpolation=cv2.INTER_NEAREST)
-                # 重新解析 ROI 区域
-                self._reparse_rois()
-
         # Convert to gray and blur slightly to reduce noise
         # 使用 11x11 核代替 21x21，性能提升约 70%，降噪效果基本相同
         gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
         self.baseline = cv2.GaussianBlur(gray, (11, 11), 0)
-        self.baseline_brightness = self.get_current_brightness(small_frame)
+        self.baseline_brightness = self._get_gray_brightness(gray, state.mask)
         
-        # 为每个 ROI 计算基线亮度
-        self.roi_baseline_brightness = []
-        for roi in self.rois:
-            roi_brightness = self._get_roi_brightness(gray, roi['sub_mask'])
-            self.roi_baseline_brightness.append(roi_brightness)
+        # 一次性计算所有 ROI 的基线亮度
+        self.roi_baseline_brightness = self._get_roi_brightness_all(gray, state)
         
-        logger.info(f"基准已建立。基准亮度: {self.baseline_brightness:.2f}, ROI 数量: {len(self.roi_baseline_brightness)}")
-
-    def _reparse_rois(self):
-        """重新解析 ROI 区域（在 mask 尺寸调整后调用）"""
-        if self.mask is None:
-            self.rois = []
-            return
+        logger.info("基准已建立。基准亮度: %.2f, ROI 数量: %d", self.baseline_brightness, len(self.roi_baseline_brightness))
 
-        self.rois = []
-        contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def _parse_roi_state(self, mask):
+        """从 mask 解析独立的 ROI 区域并构建 ROI 像素索引，返回新的 RoiState（不修改当前状态）"""
+        rois = []
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         for contour in contours:
+            # 获取边界框
             x, y, w, h = cv2.boundingRect(contour)
-            sub_mask = np.zeros_like(self.mask)
+            # 创建该 ROI 的子 mask
+            sub_mask = np.zeros_like(mask)
             cv2.drawContours(sub_mask, [contour], -1, 255, -1)
 
-            roi = {
-                'contour': contour,
-                'bounding_rect': (x, y, w, h),
-                'sub_mask': sub_mask
-            }
-            self.rois.append(roi)
+            # 存储 ROI 信息
+            rois.append(RoiRegion(contour, (x, y, w, h), sub_mask))
+
+        if not rois:
+            return RoiState(mask)
+
+        # 构建 ROI 像素的扁平索引及所属 ROI 编号（mask 变化时计算一次）
+        labels = np.zeros(mask.shape, dtype=np.int32)
+        for i, roi in enumerate(rois):
+            labels[roi.sub_mask > 0] = i + 1
+        flat_labels = labels.ravel()
+        pixel_index = np.flatnonzero(flat_labels)
+        pixel_labels = flat_labels[pixel_index] - 1
+        # 避免空 ROI 除零（与 cv2.mean 空 mask 返回 0 一致）
+        pixel_counts = np.maximum(np.bincount(pixel_labels, minlength=len(rois)), 1)
+        return RoiState(mask, tuple(rois), pixel_index, pixel_labels, pixel_counts)
 
     def process(self, frame):
         """
@@ -111,80 +135,70 @@ class ImageProcessor:
         2. Apply mask visualization (dim non-ROI areas)
         3. Calculate diff and detect changes in each ROI independently
         4. Draw static ROI contours on triggered regions
-        Returns: (vis_frame, is_triggered, total_diff_count, current_brightness)
+        Returns: (vis_frame, is_triggered, total_diff_count, current_brightness, triggered_indices)
+        vis_frame 为 645x360 处理分辨率，之后第二次调用 process() 时会被覆盖
         """
+        # 遮罩与 ROI 状态每帧只读取一次，本帧内始终使用同一份快照
+        state = self.roi_state
+        mask = state.mask
+
         # 降采样到 645x360
-        small_frame = cv2.resize(frame, (645, 360))
+        small_frame = self._small_buf = cv2.resize(frame, (645, 360), dst=self._small_buf)
 
         # 步骤1：可视化 - 叠加遮罩效果（将非 ROI 区域变暗）
-        vis_frame = small_frame.copy()
-        if self.mask is not None:
-            # 确保 mask 尺寸匹配
-            if self.mask.shape != small_frame.shape[:2]:
-                self.mask = cv2.resize(self.mask, (645, 360), interpolation=cv2.INTER_NEAREST)
-                self._reparse_rois()
-
+        # 可视化图像直接作为显示图像交给主线程：QLabel 会缩放到控件尺寸，无需再放大回原始分辨率
+        i = self._vis_index
+        self._vis_index = 1 - i
+        vis_frame = self._vis_bufs[i]
+        if vis_frame is None:
+            vis_frame = self._vis_bufs[i] = np.empty_like(small_frame)
+        np.copyto(vis_frame, small_frame)
+        if mask is not None:
             # 非 ROI 区域完全变黑（按规格书要求）
-            vis_frame[self.mask == 0] = [0, 0, 0]
+            vis_frame[mask == 0] = [0, 0, 0]
+
+        # 灰度图只转换一次，亮度统计与差分检测共用
+        gray = self._gray_buf = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
 
-        # 如果没有基线，只返回可视化图像
+        # 如果没有基线（基准建立阶段），不可能触发：跳过模糊、差分与 ROI 判断，只返回可视化图像和亮度
+        # 亮度仍需返回，主线程在建立基准的同一帧会用它与新基准比较
         if self.baseline is None:
-            current_brightness = self.get_current_brightness(small_frame)
-            # 将 vis_frame resize 回原始尺寸用于显示
-            h, w = frame.shape[:2]
-            display_frame = cv2.resize(vis_frame, (w, h), interpolation=cv2.INTER_LINEAR)
-            return display_frame, False, 0, current_brightness, []
+            current_brightness = self._get_gray_brightness(gray, mask)
+            return vis_frame, False, 0, current_brightness, []
 
         # 步骤2：检测 - 计算高斯模糊和差分
-        gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (11, 11), 0)
-        frame_delta = cv2.absdiff(self.baseline, blur)
-        _, thresh = cv2.threshold(frame_delta, self.threshold, 255, cv2.THRESH_BINARY)
+        blur = self._blur_buf = cv2.GaussianBlur(gray, (11, 11), 0, dst=self._blur_buf)
+        frame_delta = self._delta_buf = cv2.absdiff(self.baseline, blur, dst=self._delta_buf)
+        _, thresh = cv2.threshold(frame_delta, self.threshold, 255, cv2.THRESH_BINARY, dst=self._thresh_buf)
+        self._thresh_buf = thresh
 
         # 步骤3：ROI 独立判断
         is_triggered = False
         total_diff_count = 0
         triggered_indices = []
 
-        if self.rois:
-            # 计算当前帧的灰度图
-            gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-            
-            # 遍历每个 ROI 区域
-            for i, roi in enumerate(self.rois):
-                sub_mask = roi['sub_mask']
-                contour = roi['contour']
-
-                # 仅计算该 ROI 区域内的差异像素数量
-                roi_diff = cv2.bitwise_and(thresh, thresh, mask=sub_mask)
-                diff_count = cv2.countNonZero(roi_diff)
-                total_diff_count += diff_count
-
-                # 检测该 ROI 的亮度变化
-                roi_has_brightness_change = False
-                if i < len(self.roi_baseline_brightness):
-                    current_roi_brightness = self._get_roi_brightness(gray, sub_mask)
-                    baseline_roi_brightness = self.roi_baseline_brightness[i]
-                    if abs(current_roi_brightness - baseline_roi_brightness) > self.threshold:
-                        roi_has_brightness_change = True
-
-                # 如果该 ROI 有亮度变化，标记为触发
-                if roi_has_brightness_change:
-                    is_triggered = True
-                    triggered_indices.append(i)
+        if state.rois:
+            # 仅统计 ROI 区域内的差异像素数量：直接在预先计算的 ROI 像素索引上计数，
+            # 替代逐 ROI 的整帧 bitwise_and + countNonZero
+            if state.pixel_index is not None:
+                total_diff_count = int(np.count_nonzero(thresh.ravel()[state.pixel_index]))
+
+            # 检测各 ROI 的亮度变化：一次向量化计算所有 ROI，而不是逐个 cv2.mean
+            n = min(len(state.rois), len(self.roi_baseline_brightness))
+            if n:
+                current_roi_brightness = self._get_roi_brightness_all(gray, state)
+                changed = np.abs(current_roi_brightness[:n] - self.roi_baseline_brightness[:n]) > self.threshold
+                triggered_indices = np.flatnonzero(changed).tolist()
+                is_triggered = bool(triggered_indices)
         else:
             # 没有 ROI 时的全局检测
             total_diff_count = cv2.countNonZero(thresh)
             is_triggered = total_diff_count > self.min_area
 
         # 计算当前亮度
-        current_brightness = self.get_current_brightness(small_frame)
+        current_brightness = self._get_gray_brightness(gray, mask)
 
-        # 将 vis_frame resize 回原始尺寸用于显示
-        h, w = frame.shape[:2]
-        display_frame = cv2.resize(vis_frame, (w, h), interpolation=cv2.INTER_LINEAR)
-
-        return display_frame, is_triggered, total_diff_count, current_brightness, triggered_indices
+        return vis_frame, is_triggered, total_diff_count, current_brightness, triggered_indices
 
     def get_current_brightness(self, frame):
         """Calculates mean brightness within the masked region."""
@@ -192,26 +206,25 @@ class ImageProcessor:
             return 0
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        if self.mask is not None:
-            # Mask 应该已经在外部调整为正确尺寸
-            mean_val = cv2.mean(gray, mask=self.mask)[0]
-        else:
-            mean_val = cv2.mean(gray)[0]
+        return self._get_gray_brightness(gray, self.roi_state.mask)
 
-        return mean_val
+    def _get_gray_brightness(self, gray, mask):
+        """计算灰度图在遮罩区域内的平均亮度"""
+        if mask is not None:
+            # Mask 应该已经在外部调整为正确尺寸
+            return cv2.mean(gray, mask=mask)[0]
+        return cv2.mean(gray)[0]
 
-    def _get_roi_brightness(self, gray_frame, sub_mask):
-        """计算单个 ROI 区域的平均亮度"""
-        if gray_frame is None or sub_mask is None:
-            return 0
-        # 确保 mask 尺寸匹配
-        if sub_mask.shape != gray_frame.shape:
-            return 0
-        mean_val = cv2.mean(gray_frame, mask=sub_mask)[0]
-        return mean_val
+    def _get_roi_brightness_all(self, gray_frame, state):
+        """一次性计算 state 中所有 ROI 区域的平均亮度，返回按 ROI 顺序排列的数组"""
+        if state.pixel_index is None or gray_frame.shape != state.mask.shape:
+            return np.zeros(len(state.rois))
+        values = gray_frame.ravel()[state.pixel_index]
+        sums = np.bincount(state.pixel_labels, weights=values, minlength=len(state.rois))
+        return sums / state.pixel_counts
 
     def get_roi_contours(self):
         """返回所有 ROI 的轮廓列表 (基于 645x360 坐标系)"""
-        return [roi['contour'] for roi in self.rois]
+        return [roi.contour for roi in self.roi_state.rois]
     
     
@@ -1,9 +1,8 @@
-import cv2
 import os
 from PySide6.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, 
                                QLabel, QScrollArea, QMessageBox)
 from PySide6.QtGui import QImage, QPainter
-from PySide6.QtCore import Slot, Qt
+from PySide6.QtCore import Slot, Qt, QTimer
 
 from src.gui.widgets import ImageDisplay, LogViewer, CameraControlWidget, MqttConfigWidget
 from src.core.camera import CameraThread
@@ -15,6 +14,9 @@ import logging
 import time
 
 class MainWindow(QMainWindow):
+    # MQTT 连续触发时，基准重置最多推迟到首次触发后基线延时的这一倍数
+    BASELINE_MAX_WAIT_FACTOR = 5
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Camer - 多摄像头监控系统")
@@ -25,15 +27,18 @@ class MainWindow(QMainWindow):
         self.cameras = []
         self.displays = []
         self.controls = []
-        self.need_baseline_flags = [False] * 8
-        self.last_scan_times = [0.0] * 8
+        self.next_scan_times = [0.0] * 8  # 各摄像头下一次亮度扫描的截止时间（monotonic 秒）
         self.brightness_reported_flags = [False] * 8
+        self.baseline_pending_flags = [False] * 8  # 已请求重建基准、摄像头线程尚未确认
         self.scan_intervals = [300] * 8  # 默认300ms
         
         # 基线延时相关
         self.baseline_delay = 1000  # 默认延时1秒
-        self.baseline_trigger_time = 0.0  # 触发时间戳
-        self.baseline_pending = False  # 是否有待处理的基线建立
+        self.baseline_wait_limit = 0.0  # 本轮连续触发最晚的重置时刻（monotonic 秒）
+        # 延时到期由定时器事件驱动，不再在每帧回调里轮询时间戳
+        self.baseline_timer = QTimer(self)
+        self.baseline_timer.setSingleShot(True)
+        self.baseline_timer.timeout.connect(self.on_baseline_delay_elapsed)
         
         # Config Manager
         self.config_manager = ConfigManager()
@@ -43,7 +48,8 @@ class MainWindow(QMainWindow):
         client_id = self.config_manager.get_client_id()
         subscribe_topics = self.config_manager.get_subscribe_topics()
         publish_topic = self.config_manager.get_publish_topic()
-        self.mqtt_worker = MqttWorker(broker=broker, client_id=client_id, topics=subscribe_topics, publish_topic=publish_topic)
+        publish_qos = self.config_manager.get_publish_qos()
+        self.mqtt_worker = MqttWorker(broker=broker, client_id=client_id, topics=subscribe_topics, publish_topic=publish_topic, publish_qos=publish_qos)
         self.mqtt_worker.start()
         
         # Setup Logger to GUI
@@ -130,6 +136,7 @@ class MainWindow(QMainWindow):
             cam.processed_data_ready.connect(lambda frame, triggered, brightness, indices, idx=i: self.update_camera_ui(frame, triggered, brightness, indices, idx))
             cam.error_occurred.connect(lambda err, idx=i: self.handle_camera_error(err, idx))
             cam.rois_updated.connect(lambda contours, idx=i: self.displays[idx].set_rois(contours))
+            cam.baseline_ready.connect(lambda generation, idx=i: self.on_baseline_ready(generation, idx))
 
             # Control Connections
             ctrl = self.controls[i]
@@ -232,7 +239,7 @@ class MainWindow(QMainWindow):
         app_logger.info("配置加载完成。")
 
     def on_mqtt_config_updated(self, broker, client_id, subscribe_topics, publish_topic):
-        app_logger.info(f"正在更新 MQTT 配置 - Broker: {broker}, Client ID: {client_id}, 订阅: {subscribe_topics}, 发布: {publish_topic}")
+        app_logger.info("正在更新 MQTT 配置 - Broker: %s, Client ID: %s, 订阅: %s, 发布: %s", broker, client_id, subscribe_topics, publish_topic)
         self.config_manager.set_mqtt_broker(broker)
         self.config_manager.set_client_id(client_id)
         self.config_manager.set_subscribe_topics(subscribe_topics)
@@ -246,9 +253,24 @@ class MainWindow(QMainWindow):
 
     def on_mqtt_trigger(self):
         """Triggered by MQTT to reset all baselines (with delay)"""
-        self.baseline_trigger_time = time.time()
-        self.baseline_pending = True
-        app_logger.info(f"收到 MQTT 触发信号：{self.baseline_delay}ms 后重置所有摄像头基准。")
+        # 每次触发都重新计时，基准在最后一次状态变化 baseline_delay 之后才建立（等待灯光稳定）；
+        # 连续不断的触发最多把重置推迟到首次触发后 BASELINE_MAX_WAIT_FACTOR 倍延时，不会无限推迟
+        now = time.monotonic()
+        pending = self.baseline_timer.isActive()
+        if not pending:
+            self.baseline_wait_limit = now + self.baseline_delay * self.BASELINE_MAX_WAIT_FACTOR / 1000.0
+        delay = min(self.baseline_delay, max(0, int((self.baseline_wait_limit - now) * 1000)))
+        self.baseline_timer.start(delay)
+        if pending:
+            app_logger.debug("基准重置已在等待中，收到新的 MQTT 触发信号，%dms 后重置。", delay)
+        else:
+            app_logger.info("收到 MQTT 触发信号：%dms 后重置所有摄像头基准。", delay)
+
+    def on_baseline_delay_elapsed(self):
+        """基线延时到期，重置所有摄像头基准"""
+        app_logger.info("延时完成，正在重置所有摄像头基准...")
+        for i in range(8):
+            self.on_reset_baseline(i)
     
     @Slot(int)
     def on_baseline_delay_changed(self, val):
@@ -258,7 +280,7 @@ class MainWindow(QMainWindow):
         app_logger.info(f"基线延时已更新为: {val}ms")
 
     def handle_camera_error(self, err, idx):
-        app_logger.error(f"摄像头 {idx+1}: {err}")
+        app_logger.error("摄像头 %d: %s", idx + 1, err)
         # Only show popup for critical "Cannot open" errors
         if "Cannot open" in err:
             QMessageBox.warning(self, "摄像头错误", f"无法激活摄像头 {idx+1}。\n{err}")
@@ -275,16 +297,19 @@ class MainWindow(QMainWindow):
                     # 重新创建 CameraThread 实例
                     new_cam = CameraThread(camera_index=idx)
                     # 复制原 processor 的配置
-                    new_cam.processor.mask = cam.processor.mask
-                    new_cam.processor.rois = cam.processor.rois
+                    new_cam.processor.roi_state = cam.processor.roi_state  # 只读快照，可直接共享
                     new_cam.processor.threshold = cam.processor.threshold
                     new_cam.processor.min_area = cam.processor.min_area
                     # 重新连接信号
                     new_cam.processed_data_ready.connect(lambda frame, triggered, brightness, indices, idx=idx: self.update_camera_ui(frame, triggered, brightness, indices, idx))
                     new_cam.error_occurred.connect(lambda err, idx=idx: self.handle_camera_error(err, idx))
                     new_cam.rois_updated.connect(lambda contours, idx=idx: self.displays[idx].set_rois(contours))
+                    new_cam.baseline_ready.connect(lambda generation, idx=idx: self.on_baseline_ready(generation, idx))
                     # 替换旧的线程实例
                     self.cameras[idx] = new_cam
+                    # 旧线程上尚未执行的基准重建请求转交给新实例
+                    if self.baseline_pending_flags[idx]:
+                        new_cam.request_baseline()
                     new_cam.start()
                     app_logger.info(f"正在重新激活摄像头 {idx+1}...")
                 else:
@@ -312,79 +337,97 @@ class MainWindow(QMainWindow):
         # 更新 camera 的 processor
         self.cameras[idx].set_threshold(val)
         self.config_manager.set_camera_threshold(idx, val)
-        app_logger.debug(f"摄像头 {idx+1} 阈值已更新为: {val}")
+        app_logger.debug("摄像头 %d 阈值已更新为: %d", idx + 1, val)
 
     @Slot(int, int)
     def on_min_area_changed(self, val, idx):
         # 更新 camera 的 processor
         self.cameras[idx].set_min_area(val)
         self.config_manager.set_camera_min_area(idx, val)
-        app_logger.debug(f"摄像头 {idx+1} 最小面积已更新为: {val}")
+        app_logger.debug("摄像头 %d 最小面积已更新为: %d", idx + 1, val)
 
     @Slot(int, int)
     def on_scan_interval_changed(self, val, idx):
         self.scan_intervals[idx] = val
+        # 截止时间按旧间隔算出，清零后下一帧立即扫描并按新间隔重新计时
+        self.next_scan_times[idx] = 0.0
         self.config_manager.set_camera_scan_interval(idx, val)
-        app_logger.info(f"摄像头 {idx+1} 扫描间隔已更新为: {val}ms")
+        app_logger.info("摄像头 %d 扫描间隔已更新为: %dms", idx + 1, val)
 
     @Slot(int)
     def on_reset_baseline(self, idx):
-        self.need_baseline_flags[idx] = True
+        # 基准在摄像头线程中建立，主线程不直接修改 processor；
+        # 确认之前到达的帧仍按旧基准处理，不参与亮度扫描，上报标记也等确认后再清除
+        self.baseline_pending_flags[idx] = True
+        self.cameras[idx].request_baseline()
+        app_logger.info("摄像头 %d 基准重置请求已发送。", idx + 1)
+
+    def on_baseline_ready(self, generation, idx):
+        """摄像头线程已按请求重建基准"""
+        # 只有最新一次请求的确认才算完成：其后又有新请求时，继续等待
+        if generation != self.cameras[idx].baseline_generation:
+            return
+        self.baseline_pending_flags[idx] = False
         self.brightness_reported_flags[idx] = False
-        app_logger.info(f"摄像头 {idx+1} 基准重置请求已发送。")
 
     @Slot(object, bool, float, list, int)
     def update_camera_ui(self, frame, is_triggered, current_brightness, triggered_indices, idx):
         """更新摄像头 UI，处理后的数据已在子线程中完成"""
-        processor = self.cameras[idx].processor
+        camera = self.cameras[idx]
+        # 先确认收到，子线程即可准备下一帧（队列中最多积压一帧）
+        camera.frame_consumed()
+        processor = camera.processor
         display = self.displays[idx]
 
-        # 0. 检查延时基线建立（使用 currenttime - lasttime 逻辑）
-        current_time = time.time()
-        if self.baseline_pending:
-            delay_sec = self.baseline_delay / 1000.0  # 转换为秒
-            if (current_time - self.baseline_trigger_time) >= delay_sec:
-                self.baseline_pending = False
-                app_logger.info("延时完成，正在重置所有摄像头基准...")
-                for i in range(8):
-                    self.on_reset_baseline(i)
-
-        # 1. Update Baseline if requested
-        if self.need_baseline_flags[idx]:
-            processor.set_baseline(frame)
-            self.need_baseline_flags[idx] = False
-
-        # 2. 显示/隐藏报警标签
+        # 单调时钟：只用于计算扫描间隔，不受系统时间调整影响
+        current_time = time.monotonic()
+
+        # 1. 显示/隐藏报警标签
         display.set_alert(is_triggered)
 
-        # 3. ROI Brightness Scan（使用传入的亮度值，避免重复计算）
-        scan_interval_sec = self.scan_intervals[idx] / 1000.0  # 转换为秒
-        if (current_time - self.last_scan_times[idx]) >= scan_interval_sec:
-            self.last_scan_times[idx] = current_time
-            if processor.baseline_brightness is not None:
+        # 2. ROI Brightness Scan（使用传入的亮度值，避免重复计算）
+        # 每帧只与预先算好的截止时间比较一次，换算与加法只在真正扫描时进行；
+        # 基准重建尚未确认时，本帧是按旧基准处理的，跳过扫描
+        next_scan_times = self.next_scan_times
+        if current_time >= next_scan_times[idx] and not self.baseline_pending_flags[idx]:
+            next_scan_times[idx] = current_time + self.scan_intervals[idx] / 1000.0
+            # 基准亮度只读取一次，比较与日志共用
+            baseline_brightness = processor.baseline_brightness
+            if baseline_brightness is not None:
                 # 使用传入的亮度值，避免重复计算
-                if abs(current_brightness - processor.baseline_brightness) > processor.threshold:
+                if abs(current_brightness - baseline_brightness) > processor.threshold:
                     # 只在未上报过时才上报
-                    if not self.brightness_reported_flags[idx]:
-                        publish_topic = self.config_manager.get_publish_topic()
-                        self.mqtt_worker.publish(publish_topic, "")
-                        self.brightness_reported_flags[idx] = True
-                        app_logger.info(f"摄像头 {idx+1} 亮度变化触发上报：{current_brightness:.2f} (基准: {processor.baseline_brightness:.2f})")
-
-        # 4. Display Image - frame 已经是处理后的图像（包含可视化效果）
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
+                    reported_flags = self.brightness_reported_flags
+                    if not reported_flags[idx]:
+                        # 发布主题与 QoS 直接取 MqttWorker 上随配置同步的属性，不再每次查询配置字典
+                        mqtt_worker = self.mqtt_worker
+                        mqtt_worker.publish(mqtt_worker.publish_topic, "", qos=mqtt_worker.publish_qos)
+                        reported_flags[idx] = True
+                        app_logger.info("摄像头 %d 亮度变化触发上报：%.2f (基准: %.2f)", idx + 1, current_brightness, baseline_brightness)
+
+        # 窗口最小化或画面控件不可见时没有人看画面：跳过 QImage/QPixmap 转换与重绘，
+        # 检测与上报（上面的步骤）照常进行，恢复显示后下一帧即刷新
+        if self.isMinimized() or not display.isVisible():
+            return
+
+        # 3. Display Image - frame 已经是处理后的图像（包含可视化效果）
+        # 直接以 BGR888 格式包装 numpy 缓冲区，省去 cvtColor 生成 RGB 副本
+        h, w, ch = frame.shape
         bytes_per_line = ch * w
-        q_img = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
+        q_img = QImage(frame.data, w, h, bytes_per_line, QImage.Format_BGR888)
 
         display.update_image(q_img)
         
-        # 5. 更新 ROI 红色圆环状态
+        # 4. 更新 ROI 红色圆环状态
         display.update_triggered_rois(triggered_indices)
 
     def closeEvent(self, event):
+        # 先通知所有摄像头线程退出，再逐个等待，总耗时取决于最慢的线程而不是累加；
+        # MQTT 断开放在两者之间，与摄像头线程的收尾（释放设备）并行进行
+        for cam in self.cameras:
+            cam.request_stop()
         self.mqtt_worker.stop()
         for cam in self.cameras:
-            cam.stop()
+            cam.wait()
         super().closeEvent(event)
 
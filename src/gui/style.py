@@ -165,7 +165,7 @@ QScrollBar::handle:vertical:hover {
 }
 
 /* 日志区域 */
-QTextEdit[log="true"] {
+QPlainTextEdit[log="true"] {
     background-color: #141414;
     border: none;
     border-radius: 4px;
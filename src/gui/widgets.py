@@ -1,10 +1,12 @@
-from PySide6.QtWidgets import (QWidget, QLabel, QTextEdit, QVBoxLayout, 
+from PySide6.QtWidgets import (QWidget, QLabel, QPlainTextEdit, QVBoxLayout, 
                                QHBoxLayout, QCheckBox, QComboBox, QPushButton, 
                                QGroupBox, QFormLayout, QSlider, QLineEdit, QSpacerItem, QSizePolicy)
 from PySide6.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QPolygon, QBrush
-from PySide6.QtCore import Qt, Signal, Slot, QPoint
+from PySide6.QtCore import Qt, Signal, Slot, QPoint, QTimer
 import os
 import sys
+from collections import deque
+from functools import lru_cache
 
 def get_resource_path(relative_path):
     """ 获取资源绝对路径 """
@@ -15,6 +17,14 @@ def get_resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+@lru_cache(maxsize=None)
+def list_mask_files(data_dir):
+    """ 列出遮罩目录下的图片文件，结果在所有摄像头控件间共享，只扫描一次目录 """
+    if not os.path.exists(data_dir):
+        return None
+    return tuple(f for f in os.listdir(data_dir) if f.lower().endswith(('.png', '.jpg')))
+
+
 class ImageDisplay(QLabel):
     def __init__(self):
         super().__init__()
@@ -36,19 +46,18 @@ class ImageDisplay(QLabel):
                 border-radius: 4px;
             }
         """)
+        self.alert_label.move(10, 10)  # 固定在左上角，只需定位一次
         self.alert_label.hide()  # 默认隐藏
         
         self.roi_contours = []  # 缓存的 ROI 轮廓 (原始 numpy 数组)
+        self.roi_polygons = []  # 预先转换好的 QPolygon，与 roi_contours 一一对应
         self.triggered_rois = set()  # 当前触发的 ROI 索引集合
 
     def set_alert(self, visible: bool):
-        """控制报警标签的显示与隐藏"""
-        if visible:
-            self.alert_label.show()
-            # 定位到左上角
-            self.alert_label.move(10, 10)
-        else:
-            self.alert_label.hide()
+        """控制报警标签的显示与隐藏（每帧调用，状态不变时直接返回）"""
+        if visible == self.alert_label.isVisibleTo(self):
+            return
+        self.alert_label.setVisible(visible)
 
     @Slot(object)
     def update_image(self, qt_image):
@@ -59,12 +68,21 @@ class ImageDisplay(QLabel):
     def set_rois(self, contours):
         """设置 ROI 轮廓缓存"""
         self.roi_contours = contours
+        # 轮廓只在 mask 变化时更新，提前转换为 QPolygon，避免每次重绘都逐点转换
+        # contour shape is (N, 1, 2) -> (N, 2)
+        self.roi_polygons = [
+            QPolygon([QPoint(int(x), int(y)) for x, y in contour[:, 0, :]])
+            for contour in contours
+        ]
         self.triggered_rois = set()
         self.update()
 
     def update_triggered_rois(self, indices):
         """更新当前触发的 ROI"""
         if not indices:
+            # 空触发列表是最常见的情况：之前也没有触发时无需重建集合或重绘
+            if not self.triggered_rois:
+                return
             self.triggered_rois = set()
         else:
             self.triggered_rois = set(indices)
@@ -75,7 +93,7 @@ class ImageDisplay(QLabel):
         super().paintEvent(event)
         
         # 2. 如果有触发的 ROI，绘制红色圆环
-        if self.roi_contours and self.triggered_rois:
+        if self.roi_polygons and self.triggered_rois:
             painter = QPainter(self)
             painter.setRenderHint(QPainter.Antialiasing)
             
@@ -97,21 +115,15 @@ class ImageDisplay(QLabel):
             painter.scale(scale_x, scale_y)
             
             for idx in self.triggered_rois:
-                if 0 <= idx < len(self.roi_contours):
-                    contour = self.roi_contours[idx]
-                    # 转换 Numpy contour 到 QPolygon
-                    # contour shape is (N, 1, 2) -> (N, 2)
-                    points = []
-                    for pt in contour[:, 0, :]:
-                        points.append(QPoint(int(pt[0]), int(pt[1])))
-                    
-                    polygon = QPolygon(points)
-                    painter.drawPolygon(polygon)
+                if 0 <= idx < len(self.roi_polygons):
+                    painter.drawPolygon(self.roi_polygons[idx])
             
             painter.end()
 
 
 class LogViewer(QWidget):
+    MAX_LOG_LINES = 2000
+
     def __init__(self):
         super().__init__()
         layout = QVBoxLayout(self)
@@ -120,16 +132,37 @@ class LogViewer(QWidget):
         title = QLabel("系统日志")
         title.setProperty("h3", True)
         
-        self.text_area = QTextEdit()
+        # 纯文本控件：逐行追加无需富文本解析与排版，长时间运行开销稳定
+        self.text_area = QPlainTextEdit()
         self.text_area.setReadOnly(True)
         self.text_area.setProperty("log", True)
+        # 限制日志行数：长时间运行时文档不再无限增长，超出后自动丢弃最早的行
+        self.text_area.document().setMaximumBlockCount(self.MAX_LOG_LINES)
         
         layout.addWidget(title)
         layout.addWidget(self.text_area)
+        
+        # 日志先缓存，由定时器合并刷新，突发日志时只滚动/重绘一次；
+        # 缓存长度与文档上限一致，超出部分本来也会被文档丢弃，无需保留
+        self._pending_logs = deque(maxlen=self.MAX_LOG_LINES)
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(50)
+        self._flush_timer.timeout.connect(self._flush_logs)
 
     @Slot(str)
     def append_log(self, message):
-        self.text_area.append(message)
+        self._pending_logs.append(message)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush_logs(self):
+        """将缓存的日志一次性写入文本区域"""
+        if not self._pending_logs:
+            return
+        # 一次插入整批日志，而不是逐条追加
+        self.text_area.appendPlainText("\n".join(self._pending_logs))
+        self._pending_logs.clear()
         sb = self.text_area.verticalScrollBar()
         sb.setValue(sb.maximum())
 
@@ -237,10 +270,10 @@ class CameraControlWidget(QGroupBox):
         
         # 加载数据
         self.data_dir = get_resource_path('data')
-        if os.path.exists(self.data_dir):
-            masks = [f for f in os.listdir(self.data_dir) if f.lower().endswith(('.png', '.jpg'))]
+        masks = list_mask_files(self.data_dir)
+        if masks is not None:
             self.combo_mask.addItem("不使用遮罩")
-            self.combo_mask.addItems(masks)
+            self.combo_mask.addItems(list(masks))
             
         # 事件
         self.check_active.toggled.connect(self.activated.emit)
@@ -264,6 +297,7 @@ class MqttConfigWidget(QGroupBox):
 
     def __init__(self):
         super().__init__("MQTT 服务配置")
+        self._status_connected = None  # 上次应用到按钮样式的连接状态
         self.init_ui()
 
     def init_ui(self):
@@ -315,6 +349,10 @@ class MqttConfigWidget(QGroupBox):
     def update_status(self, connected, message):
         self.btn_update.setEnabled(True)
         self.btn_update.setText(f"连接 / 更新 ({message})")
+        # setStyleSheet 会触发整个控件重新 polish，连接状态未变化时跳过
+        if connected == self._status_connected:
+            return
+        self._status_connected = connected
         if connected:
             self.btn_update.setStyleSheet("background-color: #52C41A; color: white;")
         else:
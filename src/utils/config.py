@@ -9,12 +9,14 @@ class ConfigManager:
     
     def __init__(self, config_file="config.json"):
         self.config_file = config_file
+        self._saved_content = None  # 最近一次写入磁盘的内容，用于跳过无变化的保存
         self.config = {
             "mqtt": {
                 "broker": "localhost",
                 "client_id": "camer",
                 "subscribe_topics": ["changeState", "receiver"],
                 "publish_topic": "receiver",
+                "publish_qos": 1,
                 "auto_connect": True,
                 "baseline_delay": 1000
             },
@@ -96,8 +98,13 @@ class ConfigManager:
     def save_config(self):
         """保存配置到本地文件"""
         try:
+            content = json.dumps(self.config, ensure_ascii=False, indent=4)
+            # 滑块拖动等场景会频繁保存同一份配置，内容未变化时不重复写盘
+            if content == self._saved_content:
+                return
             with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=4)
+                f.write(content)
+            self._saved_content = content
             logger.info(f"成功保存配置文件: {self.config_file}")
         except Exception as e:
             logger.error(f"保存配置文件失败: {e}")
@@ -148,6 +155,15 @@ class ConfigManager:
         self.config["mqtt"]["publish_topic"] = topic
         self.save_config()
     
+    def get_publish_qos(self):
+        """获取发布 QoS（默认 1：由 Broker 确认送达，paho 负责重传）"""
+        qos = self.config["mqtt"].get("publish_qos", 1)
+        # 非法值会让每次上报都被 paho 拒绝（ValueError），回退到默认值并提示
+        if type(qos) is not int or not 0 <= qos <= 2:
+            logger.warning(f"配置中的 publish_qos 无效: {qos!r}，使用默认值 1")
+            return 1
+        return qos
+    
     def get_auto_connect(self):
         """获取是否自动连接broker"""
         return self.config["mqtt"].get("auto_connect", True)
@@ -1,4 +1,5 @@
 import logging
+import time
 from PySide6.QtCore import QObject, Signal
 
 class SignallingLogHandler(logging.Handler, QObject):
@@ -19,6 +20,25 @@ class SignallingLogHandler(logging.Handler, QObject):
         except Exception:
             self.handleError(record)
 
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that reuses the strftime() result for records logged within the same second.
+    Only the millisecond suffix is formatted per record.
+    """
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._cached_second = None
+        self._cached_time = ""
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = time.strftime(self.default_time_format, self.converter(record.created))
+            self._cached_second = second
+        return self.default_msec_format % (self._cached_time, record.msecs)
+
 def setup_logger():
     """Configures a logger with a default format."""
     logger = logging.getLogger("CamerApp")
@@ -26,7 +46,7 @@ def setup_logger():
     
     # Console Handler for debugging
     ch = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    formatter = CachedTimeFormatter('%(asctime)s - %(levelname)s - %(message)s')
     ch.setFormatter(formatter)
     logger.addHandler(ch)
     